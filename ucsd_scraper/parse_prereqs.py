@@ -2,7 +2,8 @@
 Parse prereq_raw strings into structured AND/OR form for graph building.
 
 Run after scrape_catalog.py to enrich courses.json with prereq_structured
-and build data/prereq_edges.json.
+and build data/prereq_edges.json (edge list for the frontend) and
+data/prereq_graph.json (the same edges as parallel integer arrays).
 
 Output: prereq_structured = list of tuples.
 - Each tuple = one "OR" group (satisfy at least one of these courses).
@@ -17,27 +18,55 @@ Example:
   -> [("ECON 1",), ("ECON 3",)]
 """
 
-import json
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import orjson
 import re
 import os
+import sqlite3
+import sys
 
 # UCSD course code: 2-4 letter dept + space + number + optional trailing letters (e.g. MATH 31AH)
 COURSE_CODE_RE = re.compile(r"[A-Z]{2,4} \d+[A-Z]*")
 
-# Standalone number (possibly with letter) used as shorthand for "DEPT N" (e.g. "3" -> "ECON 3")
-STANDALONE_NUM_RE = re.compile(r"^\d+[A-Z]?$", re.IGNORECASE)
+TRAILING_PUNCT_RE = re.compile(r"[.,;]+$")
+
+# Bump when parse_prereq_raw output changes so data/prereq_cache.sqlite is cleared
+PREREQ_CACHE_VERSION = 1
+
+# Below this many strings to parse, process pool start-up and IPC cost more than parsing serially
+PARALLEL_PARSE_MIN = 5000
+
+# Single-pass tokenizer for prereq_raw. At each position the alternatives are tried in order:
+# - sep:   whitespace-delimited "and" (boundary between AND groups)
+# - code:  course code; any whitespace between dept and number (e.g. "MATH\n20A" -> "MATH 20A")
+# - short: a bare number word like "3" or "3." (shorthand for "DEPT 3" after "ECON 1 and 3")
+# - end:   ";" (only the first clause is parsed) or end of string
+# - anything else is skipped, a word (or the lowercase part of one) at a time
+PREREQ_TOKEN_RE = re.compile(
+    r"(?P<sep>(?<=\s)(?i:and)(?=\s))"
+    r"|(?P<code>(?P<dept>[A-Z]{2,4})\s+(?P<number>\d+[A-Z]*))"
+    r"|(?<!\S)(?P<short>\d+[A-Za-z]?)[.,]*(?![^\s;])"
+    r"|(?P<end>;|\Z)"
+    r"|[A-Z]?[^A-Z\s;]+|\S"
+)
 
 
 def extract_course_codes(text: str) -> list[str]:
-    """Return list of course codes found in text, in order. Normalizes spacing and strips trailing punctuation."""
-    codes = []
+    """Return list of course codes found in text, in order. Normalizes spacing and strips trailing punctuation.
+
+    Codes are interned so the same code shares one string object across courses, edges and lookups.
+    """
+    # Dict as an insertion-ordered set: O(1) dedupe instead of scanning a list
+    codes = {}
     for m in COURSE_CODE_RE.finditer(text):
         code = m.group(0).strip()
         # Strip trailing period/comma if present (e.g. "ECON 3." -> "ECON 3")
-        code = re.sub(r"[.,;]+$", "", code)
-        if code and code not in codes:
-            codes.append(code)
-    return codes
+        code = TRAILING_PUNCT_RE.sub("", code)
+        if code:
+            codes[sys.intern(code)] = None
+    return list(codes)
 
 
 def parse_prereq_raw(raw: str | None) -> list[tuple[str, ...]]:
@@ -47,39 +76,113 @@ def parse_prereq_raw(raw: str | None) -> list[tuple[str, ...]]:
     - Splits by " and " to get AND segments.
     - Each segment is an OR group: extract all course codes (and handle "DEPT N and M" -> DEPT N, DEPT M).
     - Returns only course-based requirements; non-course text (e.g. "consent of instructor") is ignored.
+
+    Tokenizes in one pass with PREREQ_TOKEN_RE instead of splitting and re-scanning each segment.
     """
     if not raw or not raw.strip():
         return []
 
-    text = raw.strip()
-    # Only parse the first clause (before ";") to avoid "Students may not receive credit for both X and Y"
-    if ";" in text:
-        text = text.split(";", 1)[0].strip()
-    # Normalize whitespace and common punctuation
-    text = re.sub(r"\s+", " ", text)
-    # Split by " and " to get AND groups (each group may contain " or " alternatives)
-    and_segments = re.split(r"\s+and\s+", text, flags=re.IGNORECASE)
-
     result: list[tuple[str, ...]] = []
     last_dept: str | None = None
-
-    for segment in and_segments:
-        segment = segment.strip()
-        if not segment:
+    # Current AND segment: its course codes (dict as an ordered set), its standalone number (if any)
+    # and how many tokens it has
+    codes: dict[str, None] = {}
+    short: str | None = None
+    n_tokens = 0
+
+    for m in PREREQ_TOKEN_RE.finditer(raw):
+        kind = m.lastgroup
+        if kind == "sep" or kind == "end":
+            # Abbreviated form: "ECON 1 and 3" -> second segment is just "3" -> treat as "ECON 3"
+            if not codes and short and n_tokens == 1 and last_dept:
+                codes = {sys.intern(f"{last_dept} {short}"): None}
+            if codes:
+                result.append(tuple(codes))
+                # Track department from last code in this segment (for next abbreviated segment)
+                last_dept = next(reversed(codes)).split()[0]
+            # Only parse the first clause (before ";") to avoid "Students may not receive credit for both X and Y"
+            if kind == "end":
+                break
+            codes = {}
+            short = None
+            n_tokens = 0
             continue
 
-        codes = extract_course_codes(segment)
+        n_tokens += 1
+        if kind == "code":
+            code = sys.intern(f"{m.group('dept')} {m.group('number')}")
+            codes[code] = None
+        elif kind == "short":
+            short = m.group("short")
+
+    return result
+
+
+def parse_prereq_raw_many(raws: list[str]) -> list[list[tuple[str, ...]]]:
+    """parse_prereq_raw over raws, spread across CPU cores when there are enough strings to pay off."""
+    if len(raws) < PARALLEL_PARSE_MIN or (os.cpu_count() or 1) < 2:
+        return [parse_prereq_raw(raw) for raw in raws]
+    # parse_prereq_raw is pure, so chunks can go to worker processes as-is; chunksize amortizes IPC
+    with ProcessPoolExecutor() as executor:
+        return list(executor.map(parse_prereq_raw, raws, chunksize=64))
+
+
+def write_json(path, obj, indent=True):
+    """Serialize obj with orjson and write the bytes to path."""
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None))
 
-        # Abbreviated form: "ECON 1 and 3" -> second segment is just "3" -> treat as "ECON 3"
-        if not codes and last_dept and STANDALONE_NUM_RE.match(segment.rstrip(".,;")):
-            short = segment.rstrip(".,;").strip()
-            codes = [f"{last_dept} {short}"]
 
-        if codes:
-            result.append(tuple(codes))
-            # Track department from last code in this segment (for next abbreviated segment)
-            last_dept = codes[-1].split()[0]
+def prereq_cache_key(raw: str) -> str:
+    """Stable cache key for a prereq_raw string (the builtin hash() is salted per process)."""
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def open_prereq_cache(path: str) -> sqlite3.Connection:
+    """
+    Open (creating if needed) the SQLite cache of prereq_cache_key(raw) -> orjson-encoded prereq_structured.
+    Entries written under a different PREREQ_CACHE_VERSION are dropped.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS prereq_cache (hash TEXT PRIMARY KEY, structured BLOB)")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != PREREQ_CACHE_VERSION:
+        conn.execute("DELETE FROM prereq_cache")
+        conn.execute(f"PRAGMA user_version = {PREREQ_CACHE_VERSION}")
+        conn.commit()
+    return conn
 
+
+def parse_prereq_raw_cached(raws: list[str], conn: sqlite3.Connection) -> dict[str, list[tuple[str, ...]]]:
+    """
+    Return {raw: parse_prereq_raw(raw)} for unique raws. Hits come from the cache;
+    only misses are parsed (see parse_prereq_raw_many) and then stored.
+    raws should be the full current set: rows for strings no longer in it are deleted.
+    """
+    keys = {raw: prereq_cache_key(raw) for raw in raws}
+    with conn:
+        # Load only the rows we need via a join, rather than reading the whole table
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (hash TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM wanted")
+        conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", [(key,) for key in keys.values()])
+        stored = dict(conn.execute("SELECT hash, structured FROM prereq_cache JOIN wanted USING (hash)"))
+
+    result = {}
+    misses = []
+    for raw, key in keys.items():
+        if key in stored:
+            result[raw] = orjson.loads(stored[key])
+        else:
+            misses.append(raw)
+
+    parsed = parse_prereq_raw_many(misses)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO prereq_cache VALUES (?, ?)",
+            [(keys[raw], orjson.dumps(structured)) for raw, structured in zip(misses, parsed)],
+        )
+        # Drop entries for prereq strings that have left the catalog so the cache doesn't grow forever
+        conn.execute("DELETE FROM prereq_cache WHERE hash NOT IN (SELECT hash FROM wanted)")
+    result.update(zip(misses, parsed))
     return result
 
 
@@ -93,16 +196,17 @@ def build_prereq_edges(courses: list[dict]) -> list[dict]:
     - Edges with the same (target, or_group_index) form an OR group: satisfy at least one.
     - Edges with different or_group_index are AND: must satisfy one from each group.
     """
-    code_to_course = {c["code"]: c for c in courses}
+    # Interned so lookups against (interned) parsed prereq codes can short-circuit on identity
+    known_codes = {sys.intern(c["code"]) for c in courses}
     edges = []
 
     for course in courses:
-        target = course["code"]
+        target = sys.intern(course["code"])
         structured = course.get("prereq_structured") or []
         for or_group_index, or_tuple in enumerate(structured):
             for source in or_tuple:
                 # Only add edge if source is a known course (node in our graph)
-                if source in code_to_course:
+                if source in known_codes:
                     edges.append({
                         "source": source,
                         "target": target,
@@ -111,34 +215,81 @@ def build_prereq_edges(courses: list[dict]) -> list[dict]:
     return edges
 
 
+def build_prereq_graph(courses: list[dict]) -> dict:
+    """
+    Same edges as build_prereq_edges, stored as a struct of arrays over integer node IDs:
+
+        { "nodes": ["AIP 197T", ...], "sources": array, "targets": array, "or_group_index": array }
+
+    nodes is sorted; edge i is nodes[sources[i]] -> nodes[targets[i]] in OR group or_group_index[i].
+    The arrays are array("i") so they can be handed to numpy.asarray without copying element by element.
+    """
+    nodes = sorted({sys.intern(c["code"]) for c in courses})
+    code_to_id = {code: i for i, code in enumerate(nodes)}
+    sources = array("i")
+    targets = array("i")
+    or_group_indices = array("i")
+
+    for course in courses:
+        target_id = code_to_id[course["code"]]
+        structured = course.get("prereq_structured") or []
+        for or_group_index, or_tuple in enumerate(structured):
+            for source in or_tuple:
+                source_id = code_to_id.get(source)
+                if source_id is not None:
+                    sources.append(source_id)
+                    targets.append(target_id)
+                    or_group_indices.append(or_group_index)
+
+    return {
+        "nodes": nodes,
+        "sources": sources,
+        "targets": targets,
+        "or_group_index": or_group_indices,
+    }
+
+
 def main():
     data_dir = os.path.join(os.path.dirname(__file__), "data")
     in_path = os.path.join(data_dir, "courses.json")
     out_path = os.path.join(data_dir, "courses.json")  # overwrite with enriched version
     edges_path = os.path.join(data_dir, "prereq_edges.json")
+    graph_path = os.path.join(data_dir, "prereq_graph.json")
+    cache_path = os.path.join(data_dir, "prereq_cache.sqlite")
 
-    with open(in_path) as f:
-        courses = json.load(f)
+    with open(in_path, "rb") as f:
+        courses = orjson.loads(f.read())
 
+    # Most prereq_raw strings are unchanged between scrapes; only parse the ones we haven't seen
+    raws = list(dict.fromkeys(c["prereq_raw"] for c in courses if c.get("prereq_raw")))
+    conn = open_prereq_cache(cache_path)
+    structured_by_raw = parse_prereq_raw_cached(raws, conn)
+    conn.close()
     for c in courses:
         raw = c.get("prereq_raw")
-        c["prereq_structured"] = parse_prereq_raw(raw)
+        if not raw:
+            c["prereq_structured"] = []
+            continue
+        # Re-intern: strings from the cache or a worker process are fresh copies
+        c["prereq_structured"] = [tuple(sys.intern(code) for code in group) for group in structured_by_raw[raw]]
 
-    with open(out_path, "w") as f:
-        json.dump(courses, f, indent=2)
+    write_json(out_path, courses)
 
     edges = build_prereq_edges(courses)
-    with open(edges_path, "w") as f:
-        json.dump(edges, f, indent=2)
+    # Edges are only read by the frontend, so skip indentation
+    write_json(edges_path, edges, indent=False)
+
+    graph = build_prereq_graph(courses)
+    write_json(graph_path, {key: list(values) for key, values in graph.items()}, indent=False)
 
     # Stats
-    with_structured = sum(1 for c in courses if c.get("prereq_structured"))
-    with_edges = sum(1 for c in courses if any(c.get("prereq_structured")))
+    with_structured = sum(1 for c in courses if c["prereq_structured"])
     print(f"Enriched {len(courses)} courses with prereq_structured")
-    print(f"Courses with at least one prereq group: {with_edges}")
+    print(f"Courses with at least one prereq group: {with_structured}")
     print(f"Total edges: {len(edges)}")
     print(f"Written: {out_path}")
     print(f"Edges: {edges_path}")
+    print(f"Graph arrays: {graph_path}")
 
 
 if __name__ == "__main__":
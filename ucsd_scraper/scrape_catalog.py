@@ -1,37 +1,149 @@
-import requests
-from bs4 import BeautifulSoup
-import json
+import asyncio
+import httpx
+from selectolax.lexbor import LexborHTMLParser
+import hashlib
+import orjson
 import time
 import os
 import re
+import sys
 
 CATALOG_BASE = "https://catalog.ucsd.edu"
 COURSES_INDEX = f"{CATALOG_BASE}/front/courses.html"
 OUT_FILE = "data/courses.json"
 PER_DEPT = "data/per_department"
+HTTP_CACHE_DIR = "data/http_cache"
+
+# Cached pages younger than this are served from disk without contacting the server
+HTTP_CACHE_MAX_AGE = 24 * 60 * 60
+
+# Department pages are fetched concurrently over one HTTP/2 connection pool;
+# the concurrency cap and rate limit keep us polite to the catalog server
+MAX_CONCURRENT_REQUESTS = 8
+MAX_REQUESTS_PER_SECOND = 4
+
+# Part of each page's memo hash in parse_department. Bump whenever parse_courses, parse_course_header or
+# parse_course_body changes its output, otherwise unchanged pages keep returning their old per-department JSON
+PAGE_PARSE_VERSION = 1
+
+# "CSE 3. Fluency in Information Technology (4)" -> code, title, units (a range like "(2–4)" keeps the low end)
+COURSE_HEADER_RE = re.compile(r"^([A-Z]{2,4} \d+[A-Z]?)\.\s+(.+?)\s+\((\d+)(?:[–\-]\d+)?\)")
+# "Prerequisites:" or "Prerequisites :  " (optional spaces around colon); captures the rest
+PREREQ_HEADER_RE = re.compile(r"Prerequisites?\s*:\s*(.+)")
 
 # Create directories if not exist
 os.makedirs(PER_DEPT, exist_ok=True)
+os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
 
-def safe_get(url):
-    time.sleep(1)  # polite delay
-    resp = requests.get(url)
-    resp.raise_for_status()
+_next_request_at = 0.0
+
+
+async def _wait_for_rate_limit():
+    """Sleep until this request may go out (at most MAX_REQUESTS_PER_SECOND across all pending fetches)."""
+    global _next_request_at
+    # No lock needed: nothing awaits between reading and reserving the slot
+    now = time.monotonic()
+    delay = _next_request_at - now
+    _next_request_at = max(now, _next_request_at) + 1 / MAX_REQUESTS_PER_SECOND
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+def write_json(path, obj, indent=True):
+    """
+    Write obj to path as JSON (orjson; 2-space indent unless indent=False).
+    Written to a temp file and renamed into place, so an interrupted run never leaves a truncated file.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None))
+    os.replace(tmp_path, path)
+
+def _cache_path(url):
+    return os.path.join(HTTP_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + ".json")
+
+def dept_url(path):
+    """Absolute URL for a department path like /courses/CSE.html."""
+    return CATALOG_BASE + path if path.startswith("/") else CATALOG_BASE + "/" + path
+
+async def _fetch(client, semaphore, url):
+    """
+    GET url and return the body, using the on-disk cache in HTTP_CACHE_DIR.
+    Fresh entries skip the network; stale ones are revalidated with ETag / Last-Modified
+    and are still returned if the server can't be reached.
+    """
+    cache_path = _cache_path(url)
+    cached = None
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            try:
+                cached = orjson.loads(f.read())
+            except orjson.JSONDecodeError:
+                # Unreadable entry (e.g. from an older, non-atomic write): treat as a miss and refetch
+                cached = None
+        if cached and time.time() - cached["fetched_at"] < HTTP_CACHE_MAX_AGE:
+            return cached["body"]
+
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    async with semaphore:
+        await _wait_for_rate_limit()  # polite delay
+        try:
+            resp = await client.get(url, headers=headers)
+            if resp.status_code != 304:
+                resp.raise_for_status()
+        except httpx.HTTPError:
+            if cached is None:
+                raise
+            print(f"Request failed for {url}, using cached copy")
+            return cached["body"]
+
+    if resp.status_code == 304:
+        cached["fetched_at"] = time.time()
+        write_json(cache_path, cached, indent=False)
+        return cached["body"]
+
+    write_json(cache_path, {
+        "url": url,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "fetched_at": time.time(),
+        "body": resp.text,
+    }, indent=False)
     return resp.text
 
+async def fetch_all(urls):
+    """Fetch all urls concurrently (multiplexed over HTTP/2) and return their bodies in the same order."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    async with httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        headers={"Accept-Encoding": "gzip"},
+        limits=httpx.Limits(max_connections=16),
+    ) as client:
+        return await asyncio.gather(*(_fetch(client, semaphore, url) for url in urls))
+
+def safe_get(url):
+    """Fetch a single page (through the same cache and rate limit as fetch_all)."""
+    return asyncio.run(fetch_all([url]))[0]
+
 def parse_course_header(block):
     """
     Parse p.course-name block: "CSE 3. Fluency in Information Technology (4)"
     Returns dict with code, title, units or None.
     """
-    text = block.get_text(separator=" ").strip()
+    text = block.text(separator=" ").strip()
     # Allow trailing content after closing paren (e.g. " (4)  Tag: Applications of Computing")
-    m = re.match(r"^([A-Z]{2,4} \d+[A-Z]?)\.\s+(.+?)\s+\((\d+)(?:[–\-]\d+)?\)", text)
+    m = COURSE_HEADER_RE.match(text)
     if not m:
         return None
     code, title, units = m.groups()
     return {
-        "code": code.strip(),
+        "code": sys.intern(code.strip()),
         "title": title.strip(),
         "units": int(units),
         "description": "",
@@ -44,28 +156,28 @@ def parse_course_body(block):
     Parse p.course-descriptions block: description text and "Prerequisites: ..."
     Returns (description, prereq_raw). Handles <strong><em>Prerequisites:</em></strong> in HTML.
     """
-    text = block.get_text(separator=" ").strip()
+    text = block.text(separator=" ").strip()
+    # The catalog writes the header as "Prerequisites:", so a plain substring search locates it
+    # (or rules it out) before the regex runs
+    idx = text.find("Prerequisite")
+    if idx < 0:
+        return text, None
     prereq_raw = None
-    # Match "Prerequisites:" or "Prerequisites :  " (optional spaces around colon) and capture the rest
-    prereq_m = re.search(r"Prerequisites?\s*:\s*(.+)", text, re.IGNORECASE)
+    prereq_m = PREREQ_HEADER_RE.search(text, idx)
     if prereq_m:
         prereq_raw = prereq_m.group(1).strip()
         text = text[: prereq_m.start()].strip()
     return text, prereq_raw
 
-def scrape_department(path):
-    """
-    Scrape a single department course page. path is e.g. /courses/CSE.html
-    """
-    url = CATALOG_BASE + path if path.startswith("/") else CATALOG_BASE + "/" + path
-    html = safe_get(url)
-    soup = BeautifulSoup(html, "html.parser")
+def parse_courses(html):
+    """Parse a department page's HTML into a list of course dicts."""
+    tree = LexborHTMLParser(html)
 
     courses = []
     # Catalog uses p.course-name (header) followed by p.course-descriptions (body + prereqs)
     current_header = None
-    for p in soup.select("main p"):
-        classes = p.get("class") or []
+    for p in tree.css("main p"):
+        classes = (p.attributes.get("class") or "").split()
         if "course-name" in classes:
             current_header = parse_course_header(p)
         elif "course-descriptions" in classes and current_header:
@@ -74,24 +186,42 @@ def scrape_department(path):
             current_header["prereq_raw"] = prereq_raw
             courses.append(current_header)
             current_header = None
+    return courses
 
-    # Write per-department file
+def parse_department(path, html):
+    """
+    Parse a fetched department page and write its per-department file. path is e.g. /courses/CSE.html
+    """
+    # Skip parsing if the page is byte-for-byte what we parsed last time, with the same parser version
     dept_code = path.split("/")[-1].replace(".html", "")
-    with open(f"{PER_DEPT}/{dept_code}.json", "w") as f:
-        json.dump(courses, f, indent=2)
+    json_path = f"{PER_DEPT}/{dept_code}.json"
+    hash_path = f"{PER_DEPT}/{dept_code}.hash"
+    page_hash = hashlib.blake2b(f"{PAGE_PARSE_VERSION}\n{html}".encode(), digest_size=16).hexdigest()
+    if os.path.exists(json_path) and os.path.exists(hash_path):
+        with open(hash_path) as f:
+            if f.read() == page_hash:
+                with open(json_path, "rb") as f:
+                    return orjson.loads(f.read())
+
+    courses = parse_courses(html)
+
+    # Write per-department file, then the hash of the page it came from
+    write_json(json_path, courses)
+    with open(hash_path, "w") as f:
+        f.write(page_hash)
 
     return courses
 
 def main():
     html = safe_get(COURSES_INDEX)
-    soup = BeautifulSoup(html, "html.parser")
+    tree = LexborHTMLParser(html)
 
     # Find all course department links (hrefs like /courses/XXX.html or ../courses/XXX.html)
     # Page uses <main> not div.main-content
     dept_links = []
     seen_paths = set()
-    for a in soup.select("main a"):
-        href = a.get("href")
+    for a in tree.css("main a"):
+        href = a.attributes.get("href")
         if not href or not href.endswith(".html") or "/courses/" not in href:
             continue
         # Normalize to /courses/XXX.html
@@ -107,19 +237,21 @@ def main():
 
     print(f"Found {len(dept_links)} department pages")
 
-    for link in dept_links:
-        print(f"Scraping {link} …")
-        courses = scrape_department(link)
+    pages = asyncio.run(fetch_all([dept_url(link) for link in dept_links]))
+
+    # Parsing the whole catalog takes ~0.1s in-process, less than a process pool costs to start
+    # and pickle pages through, so it stays serial; dedupe keeps the first page a code appears on
+    for link, html in zip(dept_links, pages):
+        courses = parse_department(link, html)
+        print(f"Scraped {link} ({len(courses)} courses)")
         for c in courses:
             if c["code"] not in seen:
                 seen.add(c["code"])
                 all_courses.append(c)
 
-
     print(f"Total courses scraped: {len(all_courses)}")
 
-    with open(OUT_FILE, "w") as f:
-        json.dump(all_courses, f, indent=2)
+    write_json(OUT_FILE, all_courses)
 
 if __name__ == "__main__":
     main()
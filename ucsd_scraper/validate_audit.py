@@ -10,18 +10,22 @@ Run: python validate_audit.py
 Output: data/validation_report.txt and summary to stdout.
 """
 
-import json
+import asyncio
+import functools
+import heapq
+import orjson
 import os
 import re
+import shutil
 import sys
 
 # Reuse scraper logic
 from scrape_catalog import (
-    CATALOG_BASE,
     COURSES_INDEX,
+    dept_url,
+    fetch_all,
     safe_get,
-    parse_course_header,
-    parse_course_body,
+    parse_courses,
 )
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
@@ -32,12 +36,12 @@ REPORT_PATH = os.path.join(DATA_DIR, "validation_report.txt")
 def get_dept_links():
     """Return list of /courses/XXX.html paths from the index page."""
     html = safe_get(COURSES_INDEX)
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(html, "html.parser")
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html)
     dept_links = []
     seen = set()
-    for a in soup.select("main a"):
-        href = a.get("href")
+    for a in tree.css("main a"):
+        href = a.attributes.get("href")
         if not href or not href.endswith(".html") or "/courses/" not in href:
             continue
         path = href.replace("../", "").replace("./", "").strip()
@@ -49,43 +53,30 @@ def get_dept_links():
     return dept_links
 
 
-def fetch_live_courses(path):
-    """Fetch department page and return list of courses (same parsing as scraper)."""
-    url = CATALOG_BASE + path if path.startswith("/") else CATALOG_BASE + "/" + path
-    html = safe_get(url)
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(html, "html.parser")
-    courses = []
-    current_header = None
-    for p in soup.select("main p"):
-        classes = p.get("class") or []
-        if "course-name" in classes:
-            current_header = parse_course_header(p)
-        elif "course-descriptions" in classes and current_header:
-            description, prereq_raw = parse_course_body(p)
-            current_header["description"] = description
-            current_header["prereq_raw"] = prereq_raw
-            courses.append(current_header)
-            current_header = None
-    return courses
+def fetch_live_courses(paths):
+    """Fetch department pages concurrently and return a list of courses per page (same parsing as scraper)."""
+    pages = asyncio.run(fetch_all([dept_url(path) for path in paths]))
+    return [parse_courses(html) for html in pages]
 
 
+@functools.lru_cache(maxsize=200_000)
 def normalize(s):
-    """Normalize string for comparison: collapse whitespace, strip."""
+    """Normalize string for comparison: collapse whitespace, strip. Memoized, since many strings repeat."""
     if s is None:
         return ""
     return " ".join(str(s).split()).strip()
 
 
 def main():
-    with open(COURSES_PATH) as f:
-        our_courses = json.load(f)
+    with open(COURSES_PATH, "rb") as f:
+        our_courses = orjson.loads(f.read())
 
     # Our courses by code (one course can only appear on one catalog page)
-    our_by_code = {c["code"]: c for c in our_courses}
+    our_by_code = {sys.intern(c["code"]): c for c in our_courses}
+    our_codes = frozenset(our_by_code)
 
     dept_links = get_dept_links()
-    lines = []
+
     all_expected_codes = set()
     total_missing = 0
     total_title_mismatch = 0
@@ -94,94 +85,114 @@ def main():
     depts_ok = 0
     depts_with_issues = []
 
-    for path in sorted(dept_links):
-        dept = path.replace("/courses/", "").replace(".html", "")
-        live = fetch_live_courses(path)
-        expected_codes = {c["code"] for c in live}
-        expected_by_code = {c["code"]: c for c in live}
-        all_expected_codes |= expected_codes
-
-        # Compare by code: missing = on live page but not in our data
-        missing = expected_codes - our_by_code.keys()
-        # Extra = in our data but not on this page (we'll aggregate at end)
-        our_codes_on_page = expected_codes & our_by_code.keys()
-
-        total_missing += len(missing)
-
-        title_mismatch = []
-        units_mismatch = []
-        prereq_mismatch = []
-        for code in our_codes_on_page:
-            e = expected_by_code[code]
-            o = our_by_code[code]
-            if normalize(e.get("title")) != normalize(o.get("title")):
-                title_mismatch.append((code, e.get("title"), o.get("title")))
-            if str(e.get("units")) != str(o.get("units")):
-                units_mismatch.append((code, e.get("units"), o.get("units")))
-            if normalize(e.get("prereq_raw")) != normalize(o.get("prereq_raw")):
-                prereq_mismatch.append((code, e.get("prereq_raw"), o.get("prereq_raw")))
-
-        total_title_mismatch += len(title_mismatch)
-        total_units_mismatch += len(units_mismatch)
-        total_prereq_mismatch += len(prereq_mismatch)
-
-        ok = not missing and not title_mismatch and not units_mismatch and not prereq_mismatch
-        if ok:
-            depts_ok += 1
-        else:
-            depts_with_issues.append(dept)
-
-        lines.append(f"\n{'='*60}")
-        lines.append(f"Department: {dept} ({path})")
-        lines.append(f"  Live catalog: {len(expected_codes)} courses | In our data: {len(our_codes_on_page)}")
-        if missing:
-            lines.append(f"  MISSING IN OURS ({len(missing)}): {sorted(missing)[:20]}{' ...' if len(missing) > 20 else ''}")
-        if title_mismatch:
-            lines.append(f"  TITLE MISMATCH ({len(title_mismatch)}):")
-            for code, live_title, our_title in title_mismatch[:5]:
-                lines.append(f"    {code}: live={repr(live_title[:60])}... ours={repr(our_title[:60])}...")
-            if len(title_mismatch) > 5:
-                lines.append(f"    ... and {len(title_mismatch) - 5} more")
-        if units_mismatch:
-            lines.append(f"  UNITS MISMATCH ({len(units_mismatch)}): {[(c, e, o) for c, e, o in units_mismatch[:10]]}")
-        if prereq_mismatch:
-            lines.append(f"  PREREQ MISMATCH ({len(prereq_mismatch)}):")
-            for code, live_pr, our_pr in prereq_mismatch[:10]:
-                live_s = (live_pr or "")[:100]
-                our_s = (our_pr or "")[:100]
-                lines.append(f"    {code}:")
-                lines.append(f"      live: {repr(live_s)}")
-                lines.append(f"      ours: {repr(our_s)}")
-            if len(prereq_mismatch) > 10:
-                lines.append(f"    ... and {len(prereq_mismatch) - 10} more")
-        if ok:
-            lines.append("  OK")
-
-    extra_in_ours = set(our_by_code.keys()) - all_expected_codes
-
-    # Summary at top
-    summary = [
-        "UCSD Catalog Validation Report",
-        "=" * 60,
-        f"Department pages checked: {len(dept_links)}",
-        f"Departments with no issues: {depts_ok}",
-        f"Departments with issues: {len(depts_with_issues)} {depts_with_issues[:15]}{' ...' if len(depts_with_issues) > 15 else ''}",
-        "",
-        f"Total unique courses on live catalog: {len(all_expected_codes)}",
-        f"Total courses in our JSON: {len(our_courses)}",
-        f"Missing in ours (on catalog but not in our data): {total_missing}",
-        f"Extra in ours (in our data but not on any catalog page): {len(extra_in_ours)}",
-        f"Title mismatches (matching code, different title): {total_title_mismatch}",
-        f"Units mismatches (matching code, different units): {total_units_mismatch}",
-        f"Prereq_raw mismatches (matching code, different prereq text): {total_prereq_mismatch}",
-    ]
-    if extra_in_ours:
-        summary.append(f"  (sample extra: {sorted(extra_in_ours)[:10]})")
-    full_report = "\n".join(summary) + "\n" + "\n".join(lines)
+    dept_paths = sorted(dept_links)
+    live_pages = fetch_live_courses(dept_paths)
 
+    # Per-department sections are streamed to a temp file as we go; the summary needs the final
+    # totals, so it is written first into the real report and the sections are copied after it.
+    # Opened only after the fetches, and always removed, so a failed run leaves nothing behind.
     os.makedirs(DATA_DIR, exist_ok=True)
-    with open(REPORT_PATH, "w") as f:
-        f.write(full_report)
+    body_path = REPORT_PATH + ".body"
+    try:
+        with open(body_path, "w") as body_out:
+
+            def add_line(line):
+                body_out.write("\n" + line)
+
+            for path, live in zip(dept_paths, live_pages):
+                dept = path.replace("/courses/", "").replace(".html", "")
+                expected_codes = {c["code"] for c in live}
+                expected_by_code = {c["code"]: c for c in live}
+                all_expected_codes |= expected_codes
+
+                # Compare by code: missing = on live page but not in our data
+                missing = expected_codes - our_codes
+                # Extra = in our data but not on this page (we'll aggregate at end)
+                our_codes_on_page = expected_codes & our_codes
+
+                total_missing += len(missing)
+
+                title_mismatch = []
+                units_mismatch = []
+                prereq_mismatch = []
+                for code in our_codes_on_page:
+                    e = expected_by_code[code]
+                    o = our_by_code[code]
+                    # Fields usually match exactly, so try plain equality before normalizing
+                    e_title, o_title = e.get("title"), o.get("title")
+                    if e_title != o_title and normalize(e_title) != normalize(o_title):
+                        title_mismatch.append((code, e_title, o_title))
+                    e_units, o_units = e.get("units"), o.get("units")
+                    if e_units != o_units and str(e_units) != str(o_units):
+                        units_mismatch.append((code, e_units, o_units))
+                    e_prereq, o_prereq = e.get("prereq_raw"), o.get("prereq_raw")
+                    if e_prereq != o_prereq and normalize(e_prereq) != normalize(o_prereq):
+                        prereq_mismatch.append((code, e_prereq, o_prereq))
+
+                total_title_mismatch += len(title_mismatch)
+                total_units_mismatch += len(units_mismatch)
+                total_prereq_mismatch += len(prereq_mismatch)
+
+                ok = not missing and not title_mismatch and not units_mismatch and not prereq_mismatch
+                if ok:
+                    depts_ok += 1
+                else:
+                    depts_with_issues.append(dept)
+
+                add_line(f"\n{'='*60}")
+                add_line(f"Department: {dept} ({path})")
+                add_line(f"  Live catalog: {len(expected_codes)} courses | In our data: {len(our_codes_on_page)}")
+                if missing:
+                    add_line(f"  MISSING IN OURS ({len(missing)}): {heapq.nsmallest(20, missing)}{' ...' if len(missing) > 20 else ''}")
+                if title_mismatch:
+                    add_line(f"  TITLE MISMATCH ({len(title_mismatch)}):")
+                    for code, live_title, our_title in title_mismatch[:5]:
+                        add_line(f"    {code}: live={repr(live_title[:60])}... ours={repr(our_title[:60])}...")
+                    if len(title_mismatch) > 5:
+                        add_line(f"    ... and {len(title_mismatch) - 5} more")
+                if units_mismatch:
+                    add_line(f"  UNITS MISMATCH ({len(units_mismatch)}): {[(c, e, o) for c, e, o in units_mismatch[:10]]}")
+                if prereq_mismatch:
+                    add_line(f"  PREREQ MISMATCH ({len(prereq_mismatch)}):")
+                    for code, live_pr, our_pr in prereq_mismatch[:10]:
+                        live_s = (live_pr or "")[:100]
+                        our_s = (our_pr or "")[:100]
+                        add_line(f"    {code}:")
+                        add_line(f"      live: {repr(live_s)}")
+                        add_line(f"      ours: {repr(our_s)}")
+                    if len(prereq_mismatch) > 10:
+                        add_line(f"    ... and {len(prereq_mismatch) - 10} more")
+                if ok:
+                    add_line("  OK")
+
+        extra_in_ours = our_codes - all_expected_codes
+
+        # Summary at top
+        summary = [
+            "UCSD Catalog Validation Report",
+            "=" * 60,
+            f"Department pages checked: {len(dept_links)}",
+            f"Departments with no issues: {depts_ok}",
+            f"Departments with issues: {len(depts_with_issues)} {depts_with_issues[:15]}{' ...' if len(depts_with_issues) > 15 else ''}",
+            "",
+            f"Total unique courses on live catalog: {len(all_expected_codes)}",
+            f"Total courses in our JSON: {len(our_courses)}",
+            f"Missing in ours (on catalog but not in our data): {total_missing}",
+            f"Extra in ours (in our data but not on any catalog page): {len(extra_in_ours)}",
+            f"Title mismatches (matching code, different title): {total_title_mismatch}",
+            f"Units mismatches (matching code, different units): {total_units_mismatch}",
+            f"Prereq_raw mismatches (matching code, different prereq text): {total_prereq_mismatch}",
+        ]
+        if extra_in_ours:
+            summary.append(f"  (sample extra: {heapq.nsmallest(10, extra_in_ours)})")
+
+        with open(REPORT_PATH, "w") as f, open(body_path) as body_in:
+            f.write("\n".join(summary))
+            shutil.copyfileobj(body_in, f)
+
+    finally:
+        if os.path.exists(body_path):
+            os.remove(body_path)
 
     print("\n".join(summary))
     print(f"\nFull report written to {REPORT_PATH}")